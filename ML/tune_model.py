@@ -0,0 +1,400 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+
+# Paths
+DATA_PATH = '../AI (benmchich)/gyro_angles_labeled.csv'
+METADATA_PATH = 'model_metadata.json'
+MODEL_PATH = 'drone_tilt_random_forest_model.pkl'
+SCALER_PATH = 'scaler.pkl'
+CACHE_DIR = 'tuning_cache'
+
+FEATURES = ['angle_x', 'angle_y', 'angle_z', 'max_tilt']
+LABELS = {0: 'Stable', 1: 'Risque', 2: 'Renversement'}
+
+# Same search space as the notebook's GridSearchCV
+PARAM_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [5, 10, 20, None],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4]
+}
+
+RANDOM_STATE = 42
+MIN_RESOURCES = 500       # rows used by the first (cheapest) rung
+LATENCY_REPEATS = 200     # single-row predict calls timed per model
+LATENCY_BATCH = 1000      # rows used for the batched per-row measurement
+LATENCY_PROBE = 50        # single-row predict calls timed per candidate at each rung
+LATENCY_MARGIN = 2.0      # slack on the budget for the shorter per-rung probes
+
+
+def load_data():
+    df = pd.read_csv(DATA_PATH)
+    if 'max_tilt' not in df.columns:
+        df['max_tilt'] = np.maximum(df['angle_x'].abs(), df['angle_y'].abs())
+
+    X = df[FEATURES]
+    y = df['label']
+
+    # Same 80/20 split as the notebook so test metrics stay comparable
+    return train_test_split(X, y, test_size=0.2, random_state=RANDOM_STATE, stratify=y)
+
+
+def data_fingerprint(X, y):
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(y, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def build_estimator(params):
+    # n_jobs=1: parallelism happens across candidates/folds, and the API
+    # predicts one row at a time where thread start-up would dominate.
+    return RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=1, **params)
+
+
+def measure_latency(model, X, repeats=LATENCY_REPEATS, batch=LATENCY_BATCH):
+    """Time predict() the way api.py calls it (one row) and in batch."""
+    rows = X[:repeats]
+    timings = []
+    for i in range(len(rows)):
+        row = rows[i:i + 1]
+        start = time.perf_counter()
+        model.predict(row)
+        timings.append(time.perf_counter() - start)
+    timings_ms = np.array(timings) * 1000
+
+    batch_rows = X[:batch]
+    start = time.perf_counter()
+    model.predict(batch_rows)
+    batch_us = (time.perf_counter() - start) / len(batch_rows) * 1e6
+
+    return {
+        'single_row_ms_p50': float(np.percentile(timings_ms, 50)),
+        'single_row_ms_p95': float(np.percentile(timings_ms, 95)),
+        'single_row_ms_mean': float(timings_ms.mean()),
+        'batch_per_row_us': float(batch_us),
+        'repeats': int(len(rows)),
+        'batch_size': int(len(batch_rows))
+    }
+
+
+# =============================
+# Fold cache
+# =============================
+def cache_key(params, n_samples, fold, n_folds, fingerprint):
+    payload = json.dumps({
+        'params': params,
+        'n_samples': n_samples,
+        'fold': fold,
+        'n_folds': n_folds,
+        'fingerprint': fingerprint
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def cache_load(cache_dir, key):
+    path = os.path.join(cache_dir, key + '.json')
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Truncated file from an interrupted write: recompute it
+        return None
+
+
+def cache_store(cache_dir, key, result):
+    path = os.path.join(cache_dir, key + '.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+
+# =============================
+# Successive halving
+# =============================
+def evaluate_fold(params, X, y, train_idx, val_idx, cache_dir, key):
+    model = build_estimator(params)
+    model.fit(X[train_idx], y[train_idx])
+    preds = model.predict(X[val_idx])
+
+    # Latency is not cached here: timings taken in the pool depend on how
+    # loaded the machine is, see probe_latency().
+    result = {
+        'accuracy': float(accuracy_score(y[val_idx], preds)),
+        'f1_score': float(f1_score(y[val_idx], preds, average='weighted'))
+    }
+
+    # Written by the worker itself, so a fold is kept as soon as it
+    # finishes even if the run is interrupted before it is collected.
+    cache_store(cache_dir, key, result)
+    return result
+
+
+def plan_rungs(n_candidates, n_rows, eta, min_resources):
+    """Row budget per rung, growing by eta until the full training set."""
+    max_rungs = int(math.floor(math.log(max(n_rows / min_resources, 1), eta))) + 1
+    n_rungs = min(max_rungs, int(math.ceil(math.log(n_candidates, eta))) + 1)
+    return [int(n_rows / eta ** (n_rungs - 1 - i)) for i in range(n_rungs)]
+
+
+def run_rung(candidates, X, y, n_samples, n_folds, n_jobs, cache_dir, fingerprint):
+    X_rung, y_rung = X[:n_samples], y[:n_samples]
+    folds = list(StratifiedKFold(
+        n_splits=n_folds, shuffle=True, random_state=RANDOM_STATE
+    ).split(X_rung, y_rung))
+
+    results = {}
+    pending = []
+    for c_idx, params in enumerate(candidates):
+        for f_idx, (train_idx, val_idx) in enumerate(folds):
+            key = cache_key(params, n_samples, f_idx, n_folds, fingerprint)
+            cached = cache_load(cache_dir, key)
+            if cached is not None:
+                results[(c_idx, f_idx)] = cached
+            else:
+                pending.append((c_idx, f_idx, key, train_idx, val_idx))
+
+    print(f"  {len(results)} fold results from cache, {len(pending)} to compute")
+
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(evaluate_fold)(candidates[c_idx], X_rung, y_rung, train_idx, val_idx, cache_dir, key)
+        for c_idx, f_idx, key, train_idx, val_idx in pending
+    )
+    for (c_idx, f_idx, _, _, _), result in zip(pending, outputs):
+        results[(c_idx, f_idx)] = result
+
+    summary = []
+    for c_idx, params in enumerate(candidates):
+        fold_results = [results[(c_idx, f_idx)] for f_idx in range(n_folds)]
+        scores = [r['accuracy'] for r in fold_results]
+        summary.append({
+            'params': params,
+            'cv_mean': float(np.mean(scores)),
+            'cv_std': float(np.std(scores)),
+            'f1_mean': float(np.mean([r['f1_score'] for r in fold_results])),
+            'cv_rows': n_samples,
+            'latency_ms': None
+        })
+    return summary
+
+
+def probe_latency(summary, X, y):
+    """Time each candidate serially, once the worker pool is idle."""
+    for entry in summary:
+        model = build_estimator(entry['params'])
+        model.fit(X, y)
+        latency = measure_latency(model, X, repeats=LATENCY_PROBE, batch=LATENCY_PROBE)
+        entry['latency_ms'] = latency['single_row_ms_p50']
+
+
+def successive_halving(X, y, eta, n_folds, n_jobs, budget_ms, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = data_fingerprint(X, y)
+
+    candidates = list(ParameterGrid(PARAM_GRID))
+    rungs = plan_rungs(len(candidates), len(X), eta, MIN_RESOURCES)
+    print(f"{len(candidates)} candidates, {len(rungs)} rungs: {rungs} rows")
+
+    summary = []
+    fallbacks = []
+    for rung, n_samples in enumerate(rungs):
+        print(f"\nRung {rung + 1}/{len(rungs)}: {len(candidates)} candidates on {n_samples} rows")
+        summary = run_rung(candidates, X, y, n_samples, n_folds, n_jobs, cache_dir, fingerprint)
+        if budget_ms is not None:
+            probe_latency(summary, X[:n_samples], y[:n_samples])
+
+        # Probes are short and run on a subset of the rows, so only drop
+        # candidates that are far over budget. The strict check is done on
+        # the full re-timing in tune().
+        cutoff = None if budget_ms is None else budget_ms * LATENCY_MARGIN
+        within_budget = [s for s in summary if cutoff is None or s['latency_ms'] <= cutoff]
+        dropped = len(summary) - len(within_budget)
+        if dropped:
+            print(f"  {dropped} candidates over {cutoff:.3f} ms ({LATENCY_MARGIN}x the latency budget)")
+        if not within_budget:
+            raise RuntimeError(f"No candidate is within {LATENCY_MARGIN}x the {budget_ms} ms latency budget")
+
+        # Candidates that fit the budget rank ahead of those only within
+        # the margin, so slower models cannot crowd out every one that fits.
+        def over_budget(entry):
+            return budget_ms is not None and entry['latency_ms'] > budget_ms
+
+        within_budget.sort(key=lambda s: (over_budget(s), -s['cv_mean']))
+        best = within_budget[0]
+        latency_note = '' if best['latency_ms'] is None else f" latency={best['latency_ms']:.3f} ms"
+        print(f"  best: accuracy={best['cv_mean']:.4f}{latency_note} {best['params']}")
+
+        if rung < len(rungs) - 1:
+            keep = max(1, int(math.ceil(len(within_budget) / eta)))
+            candidates = [s['params'] for s in within_budget[:keep]]
+
+            # Best candidate cut at this rung that still fit the budget
+            cut = [s for s in within_budget[keep:] if not over_budget(s)]
+            if cut:
+                fallbacks.append(cut[0])
+        else:
+            summary = within_budget
+
+    # Latest rung first: those candidates were scored on the most rows
+    return summary, rungs, fallbacks[::-1]
+
+
+# =============================
+# Main
+# =============================
+def tune(args):
+    print("Loading data...")
+    if not os.path.exists(DATA_PATH):
+        print(f"Error: Data file not found at {DATA_PATH}")
+        return
+
+    X_train, X_test, y_train, y_test = load_data()
+
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+    y_train_arr = y_train.to_numpy()
+
+    # Fixed shuffle so every rung's subset is a prefix of the next one
+    order = np.random.RandomState(RANDOM_STATE).permutation(len(X_train_scaled))
+    X_search, y_search = X_train_scaled[order], y_train_arr[order]
+
+    start = time.perf_counter()
+    try:
+        ranking, rungs, fallbacks = successive_halving(
+            X_search, y_search, args.eta, args.cv, args.n_jobs, args.budget_ms, args.cache_dir
+        )
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return
+    search_time = time.perf_counter() - start
+
+    # If every finalist misses the budget, fall back to the best candidate
+    # that fit it but was cut at an earlier rung.
+    to_try = ranking + fallbacks
+
+    # Re-time on the full training set: the per-rung probes use fewer rows
+    # and fewer repeats and are only a filter.
+    print("\nRefitting finalists on the full training set...")
+    winner = None
+    for i, entry in enumerate(to_try):
+        if i == len(ranking):
+            print("  No finalist fits the budget, trying earlier rungs")
+        model = build_estimator(entry['params'])
+        model.fit(X_train_scaled, y_train_arr)
+        latency = measure_latency(model, X_test_scaled)
+        print(f"  {entry['params']}: p50={latency['single_row_ms_p50']:.3f} ms")
+        if args.budget_ms is None or latency['single_row_ms_p50'] <= args.budget_ms:
+            winner = (entry, model, latency)
+            break
+
+    if winner is None:
+        print(f"Error: no candidate meets the {args.budget_ms} ms budget once measured on the full training set")
+        return
+
+    entry, model, latency = winner
+    y_pred = model.predict(X_test_scaled)
+    accuracy = accuracy_score(y_test, y_pred)
+    f1 = f1_score(y_test, y_pred, average='weighted')
+
+    print(f"\nBest params: {entry['params']}")
+    print(f"Accuracy: {accuracy:.4f}  F1: {f1:.4f}  latency p50: {latency['single_row_ms_p50']:.3f} ms")
+
+    metadata = {}
+    if os.path.exists(METADATA_PATH):
+        with open(METADATA_PATH) as f:
+            metadata = json.load(f)
+
+    # The tuning result always goes under its own key. The top-level fields
+    # describe the model api.py serves, so they only change with --save.
+    metadata['tuning'] = {
+        'method': 'successive_halving',
+        'scoring': 'accuracy',
+        'eta': args.eta,
+        'cv_folds': args.cv,
+        'rungs': rungs,
+        'candidates': len(ParameterGrid(PARAM_GRID)),
+        'latency_budget_ms': args.budget_ms,
+        'search_time_s': round(search_time, 2),
+        'best_params': entry['params'],
+        'cv_mean': entry['cv_mean'],
+        'cv_std': entry['cv_std'],
+        'cv_rows': entry['cv_rows'],
+        'test_accuracy': float(accuracy),
+        'test_f1_score': float(f1),
+        'latency_profile': latency,
+        'saved': args.save
+    }
+
+    if args.save:
+        metadata.update({
+            'model_type': 'RandomForestClassifier',
+            'best_params': entry['params'],
+            'accuracy': float(accuracy),
+            'f1_score': float(f1),
+            'cv_mean': entry['cv_mean'],
+            'cv_std': entry['cv_std'],
+            'features': FEATURES,
+            'labels': LABELS,
+            'training_samples': len(X_train),
+            'test_samples': len(X_test),
+            'latency_profile': latency
+        })
+
+    if args.save:
+        with open(MODEL_PATH, 'wb') as f:
+            pickle.dump(model, f)
+        with open(SCALER_PATH, 'wb') as f:
+            pickle.dump(scaler, f)
+        print(f"Model and scaler saved: {MODEL_PATH}, {SCALER_PATH}")
+
+    with open(METADATA_PATH, 'w') as f:
+        json.dump(metadata, f, indent=2)
+    print(f"Metadata saved: {METADATA_PATH}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Successive-halving hyperparameter search for the tilt classifier"
+    )
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="max median single-row predict time in ms (default: no budget)")
+    parser.add_argument('--eta', type=int, default=3,
+                        help="halving factor: keep 1/eta candidates per rung (default: 3)")
+    parser.add_argument('--cv', type=int, default=5, help="folds per rung (default: 5)")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="parallel workers (default: all cores)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help=f"fold result cache, reused across runs (default: {CACHE_DIR})")
+    parser.add_argument('--save', action='store_true',
+                        help="also overwrite the model and scaler pickles with the winner")
+    args = parser.parse_args()
+
+    if args.eta < 2:
+        parser.error("--eta must be at least 2")
+    if args.cv < 2:
+        parser.error("--cv must be at least 2")
+    if args.n_jobs == 0:
+        parser.error("--n-jobs must be a positive worker count or negative (-1 = all cores)")
+    if args.budget_ms is not None and args.budget_ms <= 0:
+        parser.error("--budget-ms must be positive")
+    return args
+
+
+if __name__ == "__main__":
+    tune(parse_args())